@@ -10,7 +10,6 @@ from pathlib import Path
 
 import argparse
 import json
-import requests
 from typing import Any, Dict, List
 
 # Ensure libs is on path (workflow sets PYTHONPATH to .ai-monitoring/libs)
@@ -18,6 +17,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "libs"))
 from comment_state import APPLY_LOGS_LINE, STATE_ANALYZED, status_marker
 import github_api
 from file_utils import sha256_hex
+import json_utils
 
 # Severity order: lower rank = more severe. Show issues with rank <= min_issue_level rank.
 SEVERITY_RANK = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
@@ -88,10 +88,9 @@ def format_review_comment(issue: Dict[str, Any], file_path: str) -> str:
     comment += "---\n"
     comment += APPLY_LOGS_LINE + "\n\n"
 
-    # Serialize metadata as JSON
-    # Use ensure_ascii=False to prevent unnecessary escaping of quotes
-    # Use separators to avoid extra whitespace
-    metadata_json = json.dumps(metadata, ensure_ascii=False, separators=(',', ':'))
+    # Serialize metadata as compact JSON without escaping non-ASCII
+    # (same serializer as refresh_related_patches.replace_issue_data)
+    metadata_json = json_utils.dumps_compact(metadata)
     
     # Debug: Check for doubled quotes before posting
     if "''" in metadata_json:
@@ -114,7 +113,7 @@ def get_pr_changed_lines(
     headers = github_api.github_headers(github_token)
 
     try:
-        response = requests.get(url, headers=headers)
+        response = github_api.github_session().get(url, headers=headers, timeout=github_api.REQUEST_TIMEOUT_SEC)
         response.raise_for_status()
         files = response.json()
         
@@ -219,8 +218,9 @@ def main():
     changed_lines = get_pr_changed_lines(github_token, args.repository, pr_number)
     print(f"Found {len(changed_lines)} changed file(s)")
     
-    # Post review comments on specific lines
+    # Post review comments on specific lines (serially: GitHub asks for one content-creating request at a time per token)
     total_comments = 0
+    failed_comments = 0
     skipped_not_in_diff = 0
     skipped_below_level = 0
 
@@ -264,12 +264,17 @@ def main():
                 comment
             ):
                 total_comments += 1
+            else:
+                failed_comments += 1
     
     if skipped_not_in_diff > 0:
         print(f"\n⚠️ Skipped {skipped_not_in_diff} issue(s) not in PR diff")
     if skipped_below_level > 0:
         print(f"\n⚠️ Skipped {skipped_below_level} issue(s) below minimum level {args.min_issue_level}")
 
+    if failed_comments > 0:
+        print(f"\n❌ Failed to post {failed_comments} review comment(s)")
+
     print(f"✅ Posted {total_comments} review comment(s)")
     return 0
 
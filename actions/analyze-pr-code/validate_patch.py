@@ -7,6 +7,9 @@ Ensures patches follow proper git diff format
 import re
 from typing import Optional
 
+# Hunk header: @@ -old_start[,old_count] +new_start[,new_count] @@
+_HUNK_HEADER_RE = re.compile(r'@@\s+-(\d+),?(\d+)?\s+\+(\d+),?(\d+)?\s+@@')
+
 
 def normalize_patch_newlines(patch: str) -> str:
     """
@@ -91,7 +94,7 @@ def fix_hunk_header_counts(patch: str) -> str:
         # Check if this is a hunk header
         if line.startswith('@@'):
             # Parse the header
-            hunk_match = re.match(r'@@\s+-(\d+),?(\d+)?\s+\+(\d+),?(\d+)?\s+@@', line)
+            hunk_match = _HUNK_HEADER_RE.match(line)
             if hunk_match:
                 old_start = int(hunk_match.group(1))
                 new_start = int(hunk_match.group(3))
@@ -139,6 +142,10 @@ def fix_patch_format(patch: str, file_content_before: Optional[str] = None) -> s
     """
     Attempt to fix a malformed patch to follow git diff format.
     
+    Single pass over the lines: converts literal \\n to newlines, prefixes
+    bare lines inside hunks as context, and rewrites each hunk header with
+    the counted old/new line totals (same result as fix_hunk_header_counts).
+    
     Args:
         patch: The patch string to fix
         file_content_before: Original file content (optional, for better correction)
@@ -152,42 +159,46 @@ def fix_patch_format(patch: str, file_content_before: Optional[str] = None) -> s
     # First, normalize newlines (convert literal \n to actual newlines)
     patch = normalize_patch_newlines(patch)
     
-    lines = patch.split('\n')
     fixed_lines = []
-    in_hunk = False
+    header_idx = -1  # index of the current hunk header in fixed_lines (-1: before first hunk)
+    header_match = None
+    old_count = new_count = 0
     
-    for line in lines:
-        # Preserve hunk headers
+    def close_hunk() -> None:
+        # Unparseable headers are kept as-is
+        if header_match is not None:
+            old_start = int(header_match.group(1))
+            new_start = int(header_match.group(3))
+            fixed_lines[header_idx] = f'@@ -{old_start},{old_count} +{new_start},{new_count} @@'
+    
+    for line in patch.split('\n'):
         if line.startswith('@@'):
-            fixed_lines.append(line)
-            in_hunk = True
-            continue
-        
-        if not in_hunk:
-            # Before first hunk, preserve as-is
+            close_hunk()
+            header_idx = len(fixed_lines)
+            header_match = _HUNK_HEADER_RE.match(line)
+            old_count = new_count = 0
             fixed_lines.append(line)
             continue
         
-        # Empty lines
-        if not line.strip():
+        # Before first hunk, and empty lines: preserve as-is, not counted
+        if header_idx < 0 or not line.strip():
             fixed_lines.append(line)
             continue
         
-        # Already has proper prefix
-        if line.startswith(('+', '-', ' ')):
-            fixed_lines.append(line)
-            continue
-        
-        # No prefix - assume it's a context line
-        # (In git diff, context lines start with space)
-        fixed_lines.append(' ' + line)
-    
-    result = '\n'.join(fixed_lines)
-    
-    # Fix hunk header line counts
-    result = fix_hunk_header_counts(result)
-    
-    return result
+        if line.startswith('-'):
+            old_count += 1
+        elif line.startswith('+'):
+            new_count += 1
+        else:
+            # No prefix - assume it's a context line (in git diff, context lines start with space)
+            if not line.startswith(' '):
+                line = ' ' + line
+            old_count += 1
+            new_count += 1
+        fixed_lines.append(line)
+    
+    close_hunk()
+    return '\n'.join(fixed_lines)
 
 
 def format_patch_for_display(patch: str) -> str:
@@ -17,6 +17,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 from cursor_client import CursorClient
 import github_api
 from code_block import extract_code_block
+from comment_state import STATUS_RE
 from github_comment_utils import extract_issue_data_from_comment, get_root_comment
 from prompts import MONITOR_YAML_GENERATION_PROMPT
 
@@ -32,7 +33,7 @@ def _build_issue_context(root_body: str, issue_data: dict) -> str:
                 parts.append(f"  {key}: {val}")
     # Visible body without hidden blocks (so we don't duplicate)
     visible = re.sub(r"<!-- ISSUE_DATA: .+? -->", "", root_body, flags=re.DOTALL)
-    visible = re.sub(r"<!-- STATUS: \w+ -->", "", visible).strip()
+    visible = STATUS_RE.sub("", visible).strip()
     if visible:
         parts.append("\nComment body:\n" + visible)
     return "\n".join(parts) if parts else root_body
@@ -14,6 +14,7 @@ Behavior:
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
 import re
@@ -34,18 +35,29 @@ import github_api  # type: ignore
 # comment_state, comment_parsing, actions_env are in libs/
 from comment_state import APPLY_LOGS_LINE, is_analyzed_state  # type: ignore
 from comment_parsing import ISSUE_DATA_RE, extract_issue_data as extract_issue_data_from_comment  # type: ignore
-from file_utils import sha256_hex  # type: ignore
 import actions_env  # type: ignore
+import json_utils  # type: ignore
 
 # Import patch validation utilities (best-effort)
 sys.path.insert(0, str(Path(__file__).parent.parent / "analyze-pr-code"))
 try:
-    from validate_patch import normalize_patch_newlines, fix_patch_format, validate_patch_format  # type: ignore
+    from validate_patch import fix_patch_format, validate_patch_format  # type: ignore
 
     PATCH_VALIDATION_AVAILABLE = True
 except Exception:
     PATCH_VALIDATION_AVAILABLE = False
 
+# In-process patch check via libgit2 (best-effort; falls back to `git apply --check`)
+try:
+    import pygit2  # type: ignore
+
+    PYGIT2_AVAILABLE = True
+except ImportError:
+    PYGIT2_AVAILABLE = False
+
+_REPO: Optional[Any] = None
+_REPO_FAILED = False  # pygit2 could not open the repository; don't retry
+
 
 @dataclass(frozen=True)
 class ReviewComment:
@@ -54,6 +66,10 @@ class ReviewComment:
     path: Optional[str]
     user_login: Optional[str]
 
+# Body starts with the 🤖 formatter marker, or contains the visible /apply-logs line
+_BOT_MARKER_RE = re.compile(rf"\A\s*\*\*🤖|{re.escape(APPLY_LOGS_LINE)}")
+
+
 def is_bot_issue_comment(comment: ReviewComment) -> bool:
     """
     Best-effort guard: only edit bot-generated review comments.
@@ -63,15 +79,10 @@ def is_bot_issue_comment(comment: ReviewComment) -> bool:
     - the 🤖 marker used by our formatter
     - a bot author login (endswith "[bot]")
     """
-    if "ISSUE_DATA" not in comment.body:
-        return False
-    if APPLY_LOGS_LINE in comment.body:
-        return True
-    if comment.body.lstrip().startswith("**🤖"):
-        return True
-    if comment.user_login and comment.user_login.endswith("[bot]"):
-        return True
-    return False
+    return "ISSUE_DATA" in comment.body and (
+        _BOT_MARKER_RE.search(comment.body) is not None
+        or (comment.user_login or "").endswith("[bot]")
+    )
 
 
 def _verbose_enabled() -> bool:
@@ -87,18 +98,17 @@ def _debug(msg: str) -> None:
         print(f"[DEBUG] {msg}")
 
 
-def _request_json(method: str, url: str, token: str, **kwargs) -> Any:
+def _request(method: str, url: str, token: str, **kwargs) -> requests.Response:
     headers = github_api.github_headers(token)
     headers.update(kwargs.pop("headers", {}))
-    resp = requests.request(method, url, headers=headers, **kwargs)
+    kwargs.setdefault("timeout", github_api.REQUEST_TIMEOUT_SEC)
+    resp = github_api.github_session().request(method, url, headers=headers, **kwargs)
     if _verbose_enabled():
         _debug(f"{method} {url} -> {resp.status_code} ({len(resp.content)} bytes)")
     if not resp.ok:
         _log(f"HTTP error {resp.status_code} for {method} {url}: {resp.text[:500]}")
     resp.raise_for_status()
-    if resp.status_code == 204:
-        return None
-    return resp.json()
+    return resp
 
 
 def get_review_comment_by_id(token: str, repository: str, comment_id: int) -> ReviewComment:
@@ -113,16 +123,15 @@ def get_review_comment_by_id(token: str, repository: str, comment_id: int) -> Re
 
 def list_pr_review_comments(token: str, repository: str, pr_number: int) -> List[ReviewComment]:
     comments: List[ReviewComment] = []
-    page = 1
-    per_page = 100
+    url: Optional[str] = github_api.pr_comments_url(repository, pr_number)
+    params: Optional[Dict[str, Any]] = {"per_page": 100}
 
-    while True:
-        url = github_api.pr_comments_url(repository, pr_number)
-        data = _request_json("GET", url, token, params={"per_page": per_page, "page": page})
+    # Follow Link: rel="next" so a full last page does not cost an extra empty request
+    while url:
+        resp = _request("GET", url, token, params=params)
+        data = resp.json()
         if not isinstance(data, list):
             raise RuntimeError("Unexpected API response for PR comments (expected list)")
-        if not data:
-            break
         for item in data:
             comments.append(
                 ReviewComment(
@@ -132,9 +141,8 @@ def list_pr_review_comments(token: str, repository: str, pr_number: int) -> List
                     user_login=(item.get("user") or {}).get("login"),
                 )
             )
-        if len(data) < per_page:
-            break
-        page += 1
+        url = resp.links.get("next", {}).get("url")
+        params = None  # the next URL already carries per_page/page
 
     return comments
 
@@ -144,12 +152,13 @@ def update_review_comment_body(token: str, repository: str, comment_id: int, new
 
 
 def replace_issue_data(comment_body: str, new_metadata: Dict[str, Any]) -> str:
-    # Keep serialization stable like post_comment.py
-    metadata_json = json.dumps(new_metadata, ensure_ascii=False, separators=(",", ":"))
-    replacement = f"<!-- ISSUE_DATA: {metadata_json} -->"
-    if not ISSUE_DATA_RE.search(comment_body):
+    m = ISSUE_DATA_RE.search(comment_body)
+    if not m:
         raise ValueError("No ISSUE_DATA block found to replace")
-    return ISSUE_DATA_RE.sub(replacement, comment_body, count=1)
+    # Keep serialization stable like post_comment.py
+    metadata_json = json_utils.dumps_compact(new_metadata)
+    # Splice at the match bounds instead of re-scanning the body with sub()
+    return f"{comment_body[:m.start()]}<!-- ISSUE_DATA: {metadata_json} -->{comment_body[m.end():]}"
 
 
 def parse_int_line(value: Any) -> Optional[int]:
@@ -168,35 +177,47 @@ def parse_int_line(value: Any) -> Optional[int]:
     return None
 
 
-def sha256_file(path: str) -> str:
-    return sha256_hex(path)
-
-
 def read_text_file(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="replace") as f:
         return f.read()
 
 
-def extract_context_slices(file_text: str, approx_line: Optional[int], max_chars: int) -> str:
+def read_text_and_hash(path: str) -> Tuple[str, str]:
+    """Read the file once; return (text, SHA256 hex of the raw bytes)."""
+    raw = Path(path).read_bytes()
+    return raw.decode("utf-8", errors="replace"), hashlib.sha256(raw).hexdigest()
+
+
+def _join_lines(lines: List[str], start: int, end: int) -> str:
+    chunk = lines[start:end]
+    return "\n".join(chunk) + ("\n" if chunk else "")
+
+
+def split_file_context(file_text: str) -> Tuple[List[str], str, str]:
     """
-    Build a compact context to send to Cursor.
-    Includes head/tail and an around-line window when line is known.
+    Split file text once per file: (lines, head, tail).
+    head/tail are invariant across candidates, so callers compute them once and reuse.
     """
     lines = file_text.splitlines()
+    head = _join_lines(lines, 0, min(200, len(lines)))
+    tail = _join_lines(lines, max(0, len(lines) - 200), len(lines))
+    return lines, head, tail
 
-    def join_slice(start: int, end: int) -> str:
-        chunk = lines[start:end]
-        return "\n".join(chunk) + ("\n" if chunk else "")
-
-    head = join_slice(0, min(200, len(lines)))
-    tail = join_slice(max(0, len(lines) - 200), len(lines))
 
+def extract_context_slices(
+    lines: List[str], head: str, tail: str, approx_line: Optional[int], max_chars: int
+) -> str:
+    """
+    Build a compact context to send to Cursor.
+    Includes head/tail and an around-line window when line is known.
+    lines/head/tail come from split_file_context(); only the around window varies per call.
+    """
     around = ""
     if approx_line and 1 <= approx_line <= len(lines):
         # Use a moderate window; if still too large we'll shrink later.
         start = max(0, approx_line - 1 - 120)
         end = min(len(lines), approx_line - 1 + 120)
-        around = join_slice(start, end)
+        around = _join_lines(lines, start, end)
 
     context = (
         "FILE_CONTEXT_BEGIN\n"
@@ -217,7 +238,7 @@ def extract_context_slices(file_text: str, approx_line: Optional[int], max_chars
         for win in (80, 60, 40, 20, 10):
             start = max(0, approx_line - 1 - win)
             end = min(len(lines), approx_line - 1 + win)
-            around = join_slice(start, end)
+            around = _join_lines(lines, start, end)
             context = (
                 "FILE_CONTEXT_BEGIN\n"
                 "=== FILE_HEAD ===\n"
@@ -246,41 +267,44 @@ def ensure_cursor_ready(cursor: CursorClient) -> None:
         raise RuntimeError("cursor-agent verification failed (check CURSOR_API_KEY)")
 
 
+_LOOKS_LIKE_JSON = re.compile(r"^\s*\{")
+
+
 def extract_patch_from_cursor_result(result: Any) -> Optional[str]:
     """
     CursorClient may return dict, list, or string. We expect JSON: {"patch": "..."} or raw patch text.
     """
     if isinstance(result, dict):
-        patch = result.get("patch")
-        if isinstance(patch, str) and patch.strip():
-            return patch
-        # Some models may return nested {"result":{"patch":...}}
-        inner = result.get("result")
-        if isinstance(inner, dict):
-            patch = inner.get("patch")
+        # {"patch": ...}; some models return nested {"result":{"patch":...}}
+        node: Dict[str, Any] = result
+        for _ in range(2):
+            patch = node.get("patch")
             if isinstance(patch, str) and patch.strip():
                 return patch
+            node = node.get("result")
+            if not isinstance(node, dict):
+                break
         return None
     if isinstance(result, str):
         text = result.strip()
-        # Try to extract JSON object if embedded
-        try:
-            parsed = json.loads(text)
-            if isinstance(parsed, dict) and isinstance(parsed.get("patch"), str):
-                return parsed.get("patch")
-        except Exception:
-            pass
+        # Try to parse as a JSON object; skip the attempt for the common raw-diff case
+        if _LOOKS_LIKE_JSON.match(text):
+            try:
+                parsed = json_utils.loads(text)
+                if isinstance(parsed, dict) and isinstance(parsed.get("patch"), str):
+                    return parsed.get("patch")
+            except json.JSONDecodeError:
+                pass
         # Fallback: return the raw text as patch
         return text if text else None
     return None
 
 
 def normalize_and_fix_patch(patch: str) -> str:
-    patch_out = patch
+    # fix_patch_format unescapes literal \n, prefixes context lines and recounts @@ headers in one pass
     if PATCH_VALIDATION_AVAILABLE:
-        patch_out = normalize_patch_newlines(patch_out)
-        patch_out = fix_patch_format(patch_out)
-    return patch_out
+        return fix_patch_format(patch)
+    return patch
 
 
 def validate_patch_or_raise(patch: str) -> None:
@@ -294,6 +318,38 @@ def validate_patch_or_raise(patch: str) -> None:
         raise ValueError("Patch missing @@ hunk header")
 
 
+def _get_repo() -> Optional[Any]:
+    """Open (once) the pygit2 repository for the current working directory."""
+    global _REPO, _REPO_FAILED
+    if _REPO is None and not _REPO_FAILED and PYGIT2_AVAILABLE:
+        try:
+            _REPO = pygit2.Repository(".")
+        except Exception as e:
+            _debug(f"pygit2 could not open repository: {e}")
+            _REPO_FAILED = True
+    return _REPO
+
+
+def _pygit2_apply_check(file_path: str, full_patch: str) -> bool:
+    """
+    True when libgit2 can apply the patch to the working tree (no subprocess).
+    False means "not confirmed": libgit2 has no --ignore-whitespace, so the caller
+    falls back to git CLI for the final verdict and the error message.
+    """
+    repo = _get_repo()
+    if repo is None:
+        return False
+    git_patch = full_patch
+    if not git_patch.startswith("diff --git"):
+        git_patch = f"diff --git a/{file_path} b/{file_path}\n{git_patch}"
+    try:
+        diff = pygit2.Diff.parse_diff(git_patch)
+        return bool(repo.applies(diff, pygit2.GIT_APPLY_LOCATION_WORKDIR))
+    except Exception as e:
+        _debug(f"pygit2 apply check error: {e}")
+        return False
+
+
 def git_apply_check(file_path: str, patch: str) -> Tuple[bool, str]:
     """
     Validate that patch applies cleanly to current working tree.
@@ -302,11 +358,14 @@ def git_apply_check(file_path: str, patch: str) -> Tuple[bool, str]:
     full_patch = patch
     if not patch.startswith("---"):
         full_patch = f"--- a/{file_path}\n+++ b/{file_path}\n{patch}"
+    # Important: git apply treats missing trailing newline as a corrupt patch.
+    if not full_patch.endswith("\n"):
+        full_patch += "\n"
+
+    if PYGIT2_AVAILABLE and _pygit2_apply_check(file_path, full_patch):
+        return True, ""
 
     with tempfile.NamedTemporaryFile(mode="w", suffix=".patch", delete=False) as tmp:
-        # Important: git apply treats missing trailing newline as a corrupt patch.
-        if not full_patch.endswith("\n"):
-            full_patch += "\n"
         tmp.write(full_patch)
         tmp_path = tmp.name
 
@@ -360,6 +419,31 @@ def build_cursor_prompt(issue: Dict[str, Any], file_path: str) -> str:
     )
 
 
+# Verified patches keyed by (prompt, file hash, line): identical requests within a run reuse the answer.
+# Only patches that passed git_apply_check are stored, so a failed answer is never handed out again.
+_PATCH_CACHE: Dict[str, str] = {}
+
+
+def patch_cache_key(prompt: str, current_hash: str, line_int: int) -> str:
+    return hashlib.sha256(f"{prompt}\0{current_hash}\0{line_int}".encode("utf-8")).hexdigest()
+
+
+def request_patch(
+    cursor: CursorClient,
+    prompt: str,
+    context: str,
+    cache_key: str,
+    verbose: bool = False,
+) -> Optional[str]:
+    """Ask Cursor for a patch, reusing a verified patch for an identical prompt on the same file version."""
+    cached = _PATCH_CACHE.get(cache_key)
+    if cached is not None:
+        _log("Reusing verified patch from an identical Cursor request")
+        return cached
+    result = cursor.send_message(prompt, context=context, verbose=verbose)
+    return extract_patch_from_cursor_result(result)
+
+
 def _get_refresh_candidates(
     github_token: str,
     repository: str,
@@ -431,7 +515,7 @@ def _refresh_all_comments(
 
     cursor = CursorClient(api_key=cursor_api_key)
     ensure_cursor_ready(cursor)
-    max_chars = int(os.getenv("CURSOR_AGENT_MAX_PROMPT_CHARS", "250000"))
+    max_chars = cursor.max_prompt_chars()
 
     updated = 0
     skipped = 0
@@ -444,8 +528,8 @@ def _refresh_all_comments(
         if not os.path.exists(applied_file):
             _log(f"⚠️ File not in workspace: {applied_file}; skipping {len(candidates)} comment(s)")
             continue
-        file_text = read_text_file(applied_file)
-        current_hash = sha256_file(applied_file)
+        file_text, current_hash = read_text_and_hash(applied_file)
+        lines, head, tail = split_file_context(file_text)
         candidates = sorted(candidates, key=lambda t: t[2])[:remaining]
         remaining -= len(candidates)
 
@@ -457,10 +541,12 @@ def _refresh_all_comments(
                     f"APPROX_LINE: {line_int}\n"
                     f"CURRENT_FILE_SHA256: {current_hash}\n\n"
                 )
-                context += extract_context_slices(file_text, approx_line=line_int, max_chars=max_chars - 4000)
+                context += extract_context_slices(
+                    lines, head, tail, approx_line=line_int, max_chars=max_chars - 4000
+                )
                 prompt = build_cursor_prompt(meta, applied_file)
-                result = cursor.send_message(prompt, context=context, verbose=verbose)
-                patch = extract_patch_from_cursor_result(result)
+                cache_key = patch_cache_key(prompt, current_hash, line_int)
+                patch = request_patch(cursor, prompt, context, cache_key, verbose=verbose)
                 if not patch:
                     _log("❌ No patch returned from Cursor; skipping")
                     failed += 1
@@ -473,10 +559,11 @@ def _refresh_all_comments(
                     _log(f"Reason: {reason.strip()[:800]}")
                     failed += 1
                     continue
-                new_meta = dict(meta)
-                new_meta["patch"] = patch
-                new_meta["file_hash"] = current_hash
-                new_body = replace_issue_data(comment.body, new_meta)
+                _PATCH_CACHE[cache_key] = patch
+                # meta was parsed from this comment only; update it in place
+                meta["patch"] = patch
+                meta["file_hash"] = current_hash
+                new_body = replace_issue_data(comment.body, meta)
                 if new_body == comment.body:
                     _log("No body change detected; skipping update")
                     skipped += 1
@@ -606,9 +693,14 @@ def main() -> int:
     all_comments = list_pr_review_comments(github_token, repository, pr_number)
     _debug(f"Total PR review comments: {len(all_comments)}")
 
-    # Filter to same file and ISSUE_DATA-present
+    # Filter to same file and ISSUE_DATA-present.
+    # Cheap substring precheck before regex + JSON: ISSUE_DATA is always serialized compactly
+    # (post_comment.py / replace_issue_data), so a same-file comment contains this exact needle.
+    needle = '"file":' + json_utils.dumps_compact(applied_file)
     candidates: List[Tuple[ReviewComment, Dict[str, Any], int]] = []
     for c in all_comments:
+        if "ISSUE_DATA" not in c.body or needle not in c.body:
+            continue
         # Safety: only touch bot-style comments (never edit human review comments).
         if not is_bot_issue_comment(c):
             continue
@@ -642,8 +734,8 @@ def main() -> int:
     if not os.path.exists(applied_file):
         _log(f"ERROR: Target file not found in workspace: {applied_file}")
         return 1
-    file_text = read_text_file(applied_file)
-    current_hash = sha256_file(applied_file)
+    file_text, current_hash = read_text_and_hash(applied_file)
+    lines, head, tail = split_file_context(file_text)
     _debug(f"Current file hash: {current_hash}")
 
     cursor_api_key = os.getenv("CURSOR_API_KEY")
@@ -655,8 +747,8 @@ def main() -> int:
     cursor = CursorClient(api_key=cursor_api_key)
     ensure_cursor_ready(cursor)
 
-    # Avoid OS argv limits (cursor-agent prompt sent as argv)
-    max_chars = int(os.getenv("CURSOR_AGENT_MAX_PROMPT_CHARS", "250000"))
+    # Avoid OS argv limits when the cursor-agent prompt is sent as argv (no limit via stdin)
+    max_chars = cursor.max_prompt_chars()
 
     updated = 0
     skipped = 0
@@ -671,13 +763,13 @@ def main() -> int:
             f"APPROX_LINE: {line_int}\n"
             f"CURRENT_FILE_SHA256: {current_hash}\n\n"
         )
-        context += extract_context_slices(file_text, approx_line=line_int, max_chars=max_chars - 4000)
+        context += extract_context_slices(lines, head, tail, approx_line=line_int, max_chars=max_chars - 4000)
 
         prompt = build_cursor_prompt(meta, applied_file)
 
         try:
-            result = cursor.send_message(prompt, context=context, verbose=verbose)
-            patch = extract_patch_from_cursor_result(result)
+            cache_key = patch_cache_key(prompt, current_hash, line_int)
+            patch = request_patch(cursor, prompt, context, cache_key, verbose=verbose)
             if not patch:
                 _log("❌ No patch returned from Cursor; skipping")
                 failed += 1
@@ -692,14 +784,14 @@ def main() -> int:
                 _log(f"Reason: {reason.strip()[:800]}")
                 failed += 1
                 continue
+            _PATCH_CACHE[cache_key] = patch
 
-            # Update metadata
-            new_meta = dict(meta)
-            new_meta["patch"] = patch
-            new_meta["file_hash"] = current_hash
+            # Update metadata (meta was parsed from this comment only; no copy needed)
+            meta["patch"] = patch
+            meta["file_hash"] = current_hash
 
             # Replace in body and PATCH-edit comment
-            new_body = replace_issue_data(comment.body, new_meta)
+            new_body = replace_issue_data(comment.body, meta)
             if new_body == comment.body:
                 _log("No body change detected; skipping update")
                 skipped += 1
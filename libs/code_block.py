@@ -3,7 +3,20 @@
 from __future__ import annotations
 
 import re
-from typing import Optional
+from typing import Dict, Optional
+
+_GENERIC_BLOCK_RE = re.compile(r"```\s*\n(.*?)\n```", re.DOTALL)
+# Compiled ```<language> ... ``` patterns, one per language seen
+_LANG_BLOCK_RES: Dict[str, "re.Pattern[str]"] = {}
+
+
+def _lang_block_re(language: str) -> "re.Pattern[str]":
+    pattern = _LANG_BLOCK_RES.get(language)
+    if pattern is None:
+        pattern = _LANG_BLOCK_RES.setdefault(
+            language, re.compile(rf"```{re.escape(language)}\s*\n(.*?)\n```", re.DOTALL)
+        )
+    return pattern
 
 
 def extract_code_block(text: str, language: str = "yaml") -> str:
@@ -14,13 +27,8 @@ def extract_code_block(text: str, language: str = "yaml") -> str:
     if not text or not text.strip():
         return ""
     text = text.strip()
-    # Try ```language ... ``` first
-    pattern_lang = rf"```{re.escape(language)}\s*\n(.*?)\n```"
-    match = re.search(pattern_lang, text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    # Fallback: generic ``` ... ```
-    match = re.search(r"```\s*\n(.*?)\n```", text, re.DOTALL)
+    # Try ```language ... ``` first, then generic ``` ... ```
+    match = _lang_block_re(language).search(text) or _GENERIC_BLOCK_RE.search(text)
     if match:
         return match.group(1).strip()
     return ""
@@ -6,6 +6,11 @@ import json
 import re
 from typing import Any, Dict, Optional
 
+try:
+    from . import json_utils
+except ImportError:
+    import json_utils  # when libs is on PYTHONPATH (e.g. workflow)
+
 ISSUE_DATA_RE = re.compile(r"<!--\s*ISSUE_DATA:\s*(.+?)\s*-->", re.DOTALL)
 
 
@@ -16,20 +21,20 @@ def extract_issue_data(comment_body: str, verbose: bool = False) -> Optional[Dic
     """
     if not comment_body:
         return None
-    m = ISSUE_DATA_RE.search(comment_body)
+    m = ISSUE_DATA_RE.search(comment_body) if "ISSUE_DATA:" in comment_body else None
     if not m:
         if verbose:
             print("[DEBUG] No ISSUE_DATA found in comment")
         return None
     raw = m.group(1)
     try:
-        data = json.loads(raw)
+        data = json_utils.loads(raw)
         if verbose:
             print(f"[DEBUG] Extracted issue data with keys: {list(data.keys())}")
         return data
     except json.JSONDecodeError as e:
         try:
-            data = json.loads(raw.strip())
+            data = json_utils.loads(raw.strip())
             if verbose:
                 print(f"[DEBUG] Extracted issue data with keys: {list(data.keys())}")
             return data
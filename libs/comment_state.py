@@ -6,23 +6,26 @@ Can be run as a script:
 """
 
 import argparse
-import json
 import os
 import re
 import sys
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
 
 import requests
 
 try:
     from . import actions_env
     from . import github_api
+    from . import json_utils
 except ImportError:
     import actions_env  # when libs is on PYTHONPATH (e.g. workflow)
     import github_api
+    import json_utils
 
 # Marker in comment body: <!-- STATUS: <state> -->
-STATUS_RE = re.compile(r"<!--\s*STATUS:\s*(\w+)\s*-->")
+# States are ASCII and may contain '-' (gc-integrated), which \w does not match
+STATUS_RE = re.compile(r"<!--\s*STATUS:\s*([A-Za-z-]+)\s*-->", re.ASCII)
 
 COMMENT_STATES = ("analyzed", "applied", "gc-integrated")
 STATE_ANALYZED = "analyzed"
@@ -34,16 +37,21 @@ APPLY_LOGS_LINE = "Reply with `/apply-logs` to apply this change automatically."
 APPLIED_LINE = "✅ Applied"
 
 
+_STATUS_MARKERS = {s: f"<!-- STATUS: {s} -->" for s in COMMENT_STATES}
+
+
 def status_marker(state: str) -> str:
     """Return the hidden HTML marker for a state, e.g. '<!-- STATUS: analyzed -->'."""
-    if state not in COMMENT_STATES:
-        raise ValueError(f"Invalid state {state!r}; must be one of {COMMENT_STATES}")
-    return f"<!-- STATUS: {state} -->"
+    try:
+        return _STATUS_MARKERS[state]
+    except KeyError:
+        raise ValueError(f"Invalid state {state!r}; must be one of {COMMENT_STATES}") from None
 
 
 def get_comment_state(body: str) -> Optional[str]:
     """Parse comment body for STATUS marker. Returns None when no marker (treated as analyzed)."""
-    if not body:
+    # Substring check first: most comments have no marker and this skips the regex.
+    if not body or "STATUS:" not in body:
         return None
     m = STATUS_RE.search(body)
     if not m:
@@ -65,32 +73,35 @@ def set_comment_state_body(body: str, new_state: str) -> str:
     """
     if new_state not in COMMENT_STATES:
         raise ValueError(f"Invalid state {new_state!r}; must be one of {COMMENT_STATES}")
-    new_body = body
-    # Replace existing STATUS marker if present
-    if STATUS_RE.search(new_body):
-        new_body = STATUS_RE.sub(status_marker(new_state), new_body, count=1)
-    else:
-        new_body = new_body.rstrip() + "\n\n" + status_marker(new_state) + "\n"
+    marker = status_marker(new_state)
+    # Replace existing STATUS marker if present (single scan), else append one
+    new_body, n = STATUS_RE.subn(lambda _m: marker, body, count=1)
+    if n == 0:
+        new_body = body.rstrip() + "\n\n" + marker + "\n"
     # State-specific visible text
-    if new_state == STATE_APPLIED and APPLY_LOGS_LINE in new_body:
-        new_body = new_body.replace(
-            APPLY_LOGS_LINE + "\n\n",
-            APPLIED_LINE + "\n\n",
-            1,
-        )
-        if APPLY_LOGS_LINE in new_body:
-            new_body = new_body.replace(APPLY_LOGS_LINE, APPLIED_LINE, 1)
+    if new_state == STATE_APPLIED:
+        # Surrounding newlines are kept as-is, so one replace covers both layouts
+        new_body = new_body.replace(APPLY_LOGS_LINE, APPLIED_LINE, 1)
     return new_body
 
 
 # --- CLI (check / set) ---
 
 
+# Step outputs are buffered and written with one append by _flush_github_output()
+_PENDING_OUTPUTS: List[Tuple[str, str]] = []
+
+
 def _set_github_output(key: str, value: str) -> None:
+    _PENDING_OUTPUTS.append((key, value))
+
+
+def _flush_github_output() -> None:
     github_output = os.getenv("GITHUB_OUTPUT")
-    if github_output:
+    if github_output and _PENDING_OUTPUTS:
         with open(github_output, "a") as f:
-            f.write(f"{key}={value}\n")
+            f.write("".join(f"{key}={value}\n" for key, value in _PENDING_OUTPUTS))
+    _PENDING_OUTPUTS.clear()
 
 
 def _get_comment(github_token: str, repository: str, comment_id: int) -> Any:
@@ -108,8 +119,11 @@ def _cmd_check(args: argparse.Namespace) -> int:
         _set_github_output("should_apply", "false")
         return 1
     try:
-        parent = _get_comment(github_token, args.repository, int(args.in_reply_to_id))
-        trigger = _get_comment(github_token, args.repository, int(args.comment_id))
+        # Independent GETs: issue both at once over the pooled session (1 RTT instead of 2)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parent_f = executor.submit(_get_comment, github_token, args.repository, int(args.in_reply_to_id))
+            trigger_f = executor.submit(_get_comment, github_token, args.repository, int(args.comment_id))
+            parent, trigger = parent_f.result(), trigger_f.result()
     except Exception as e:
         print(f"ERROR: Failed to fetch comments: {e}")
         if verbose:
@@ -129,8 +143,8 @@ def _cmd_check(args: argparse.Namespace) -> int:
         "parent_comment_id": parent.get("id"),
         "parent_comment_body": parent.get("body", ""),
     }
-    with open(args.output_file, "w") as f:
-        json.dump(result, f, indent=2)
+    with open(args.output_file, "wb") as f:
+        f.write(json_utils.dumps_indented(result))
     _set_github_output("should_apply", "true")
     _set_github_output("comment_id", str(result["comment_id"]))
     _set_github_output("parent_comment_id", str(result["parent_comment_id"]))
@@ -190,7 +204,10 @@ def main() -> int:
     set_p.set_defaults(func=_cmd_set)
 
     args = parser.parse_args()
-    return args.func(args)
+    try:
+        return args.func(args)
+    finally:
+        _flush_github_output()
 
 
 if __name__ == "__main__":
@@ -4,28 +4,105 @@ Cursor CLI Client
 Simple wrapper for sending messages to Cursor CLI.
 """ 
 
+import asyncio
 import os
 import subprocess
+import sys
 import json
 import re
+import shutil
 from pathlib import Path
-from typing import Optional, Any
-     
+from typing import Optional, Any, List, Tuple, Union
+
+try:
+    from . import json_utils
+except ImportError:
+    import json_utils  # when libs is on PYTHONPATH (e.g. workflow)
+
+# Per-call cursor-agent timeout
+CURSOR_AGENT_TIMEOUT_SEC = 300
+
+# Patterns used when parsing/redacting cursor-agent output
+_JSON_FENCE_RE = re.compile(r'```json\s*\n(.*?)\n```', re.DOTALL)
+_SK_RE = re.compile(r'sk-[a-zA-Z0-9_-]+')
+# First characters a JSON text can start with (object, array, string, number, true/false/null)
+_JSON_START_CHARS = frozenset('{["-0123456789tfn')
+
+
+def _decode(raw: Union[str, bytes]) -> str:
+    """Text view of subprocess output captured as bytes."""
+    return raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else raw
+
+
+def _redact(s: str, max_len: int = 600) -> str:
+    """Truncated preview of s with sk-... API keys masked."""
+    head = s[:max_len]
+    suffix = "..." if len(s) > max_len else ""
+    if 'sk-' not in head:
+        # Common case: nothing to mask, skip the regex
+        return head + suffix
+    return _SK_RE.sub('sk-***REDACTED***', head) + suffix
+
+
+def _versioned_agent_dirs(cursor_dir: str) -> List[str]:
+    """
+    Candidate cursor-agent bin dirs under cursor_dir/versions/*/bin, newest version first.
+    Uses one scandir (d_type from getdents) instead of glob's per-entry stat calls.
+    """
+    versions_dir = os.path.join(cursor_dir, "versions")
+    try:
+        with os.scandir(versions_dir) as it:
+            names = [entry.name for entry in it if entry.is_dir()]
+    except OSError:
+        return []
+    return [os.path.join(versions_dir, name, "bin") for name in sorted(names, reverse=True)]
+
+
 class CursorClient:
     """Client for sending messages to Cursor CLI."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, prompt_via_stdin: Optional[bool] = None):
         """
         Initialize Cursor client.
         
         Args:
             api_key: Cursor API key (defaults to CURSOR_API_KEY env var)
+            prompt_via_stdin: Pipe the prompt on stdin instead of argv, which lifts the
+                ARG_MAX limit (defaults to CURSOR_AGENT_PROMPT_STDIN env var)
         """
         self.api_key = api_key or os.getenv('CURSOR_API_KEY')
         if not self.api_key:
             raise ValueError("CURSOR_API_KEY environment variable is required")
+        if prompt_via_stdin is None:
+            prompt_via_stdin = os.getenv('CURSOR_AGENT_PROMPT_STDIN', 'false').lower() in ('true', '1')
+        self.prompt_via_stdin = prompt_via_stdin
         self.home_dir = Path.home()
-        self.cursor_agent_path = None
+        # Static install locations, joined once as plain strings
+        home = str(self.home_dir)
+        self._cursor_dir = os.path.join(home, ".cursor")
+        self._search_paths = [os.path.join(home, *p) for p in ((".cursor", "bin"), (".local", "bin"), ("bin",))]
+        # Resolve once so send_message can exec the absolute path (no PATH lookup per call)
+        self.cursor_agent_path = shutil.which('cursor-agent')
+        # Child environment, built once and reused by every send_message call
+        self._env: dict = {}
+        self.refresh_env()
+    
+    def refresh_env(self) -> None:
+        """Re-snapshot os.environ for cursor-agent (call after mutating the process environment)."""
+        self._env = {**os.environ, 'CURSOR_API_KEY': self.api_key}
+    
+    def max_prompt_chars(self) -> int:
+        """
+        Prompt size budget for callers that trim context.
+        
+        Returns:
+            CURSOR_AGENT_MAX_PROMPT_CHARS when set; otherwise an argv-safe default,
+            or no limit when the prompt is sent on stdin
+        """
+        env_limit = os.getenv('CURSOR_AGENT_MAX_PROMPT_CHARS')
+        if env_limit:
+            return int(env_limit)
+        return sys.maxsize if self.prompt_via_stdin else 250000
     
     def install_cursor_cli(self) -> bool:
         """
@@ -35,40 +112,25 @@ class CursorClient:
             True if installation successful or already installed, False otherwise
         """
         try:
-            # Check if cursor-agent already exists
-            result = subprocess.run(['which', 'cursor-agent'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                self.cursor_agent_path = result.stdout.strip()
+            # Check if cursor-agent already exists (PATH scan in-process, no `which` fork)
+            agent_path = self.cursor_agent_path or shutil.which('cursor-agent')
+            if agent_path:
+                self.cursor_agent_path = agent_path
                 return True
             
             # Install Cursor
             install_cmd = "curl https://cursor.com/install -fsS | bash"
             subprocess.run(install_cmd, shell=True, check=True)
             
-            # Search for cursor-agent binary
-            search_paths = [
-                self.home_dir / ".cursor" / "bin",
-                self.home_dir / ".local" / "bin",
-                self.home_dir / "bin"
-            ]
-            
-            for path in search_paths:
-                cursor_bin = path / "cursor-agent"
-                if cursor_bin.exists() and cursor_bin.is_file():
-                    self.cursor_agent_path = str(cursor_bin)
+            # Search known install dirs, then ~/.cursor/versions/*/bin (newest first)
+            for path in [*self._search_paths, *_versioned_agent_dirs(self._cursor_dir)]:
+                cursor_bin = os.path.join(path, "cursor-agent")
+                if os.path.isfile(cursor_bin):
+                    self.cursor_agent_path = cursor_bin
                     os.environ['PATH'] = f"{path}:{os.environ['PATH']}"
+                    self.refresh_env()
                     return True
             
-            # Deep search in ~/.cursor directory
-            cursor_dir = self.home_dir / ".cursor"
-            if cursor_dir.exists():
-                for item in cursor_dir.rglob("cursor-agent"):
-                    if item.is_file():
-                        self.cursor_agent_path = str(item)
-                        os.environ['PATH'] = f"{item.parent}:{os.environ['PATH']}"
-                        return True
-            
             return False
             
         except Exception:
@@ -82,11 +144,8 @@ class CursorClient:
             True if setup is valid, False otherwise
         """
         if not self.cursor_agent_path:
-            result = subprocess.run(['which', 'cursor-agent'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                self.cursor_agent_path = result.stdout.strip()
-            else:
+            self.cursor_agent_path = shutil.which('cursor-agent')
+            if not self.cursor_agent_path:
                 return False
         
         return bool(self.api_key)
@@ -106,75 +165,19 @@ class CursorClient:
         Raises:
             Exception: If Cursor CLI is not available or call fails
         """
-        # Build full prompt
-        full_prompt = f"{context}\n\n{prompt}" if context else prompt
-        
-        if verbose:
-            print(f"[DEBUG] Sending to cursor-agent:")
-            print(f"  Prompt length: {len(prompt)} chars")
-            print(f"  Context length: {len(context) if context else 0} chars")
-            print(f"  Full prompt length: {len(full_prompt)} chars")
-        
+        full_prompt = self._full_prompt(prompt, context, verbose)
         try:
-            # Run cursor-agent
-            cmd = ['cursor-agent', '-p', full_prompt, '--output-format', 'json']
-            
-            env = os.environ.copy()
-            env['CURSOR_API_KEY'] = self.api_key
-            
+            cmd, stdin_input = self._build_cmd(full_prompt)
             result = subprocess.run(
                 cmd,
+                input=stdin_input,
                 capture_output=True,
-                text=True,
-                env=env,
-                timeout=300
+                env=self._env,
+                timeout=CURSOR_AGENT_TIMEOUT_SEC
+            )
+            return self._handle_output(
+                result.returncode, result.stdout, result.stderr, prompt, context, full_prompt, verbose
             )
-            
-            if verbose:
-                print(f"[DEBUG] cursor-agent response:")
-                print(f"  Return code: {result.returncode}")
-                print(f"  Stdout length: {len(result.stdout)} chars")
-                print(f"  Stderr length: {len(result.stderr)} chars")
-                if result.stdout:
-                    print(f"  Stdout preview: {result.stdout[:500]}")
-                if result.stderr:
-                    print(f"  Stderr preview: {result.stderr[:500]}")
-            
-            if result.returncode != 0:
-                raise Exception(f"cursor-agent failed: {result.stderr}")
-            
-            parsed = self._parse_output(result.stdout, verbose=verbose)
-            
-            if verbose:
-                print(f"[DEBUG] Parsed result type: {type(parsed)}")
-                print(f"[DEBUG] Parsed result preview: {str(parsed)[:500]}")
-            
-            # Warn if result is empty
-            if not parsed or (isinstance(parsed, str) and not parsed.strip()):
-                ctx_len = len(context) if context else 0
-                print(f"WARNING: Cursor API returned empty result. This may indicate:")
-                print(f"  - Rate limiting or quota exhausted")
-                print(f"  - API key may not have access")
-                print(f"  - Prompt/context may be too long")
-                print(f"[INFO] Context length: prompt={len(prompt)} chars, context={ctx_len} chars, full_prompt={len(full_prompt)} chars")
-                print(f"[INFO] API key: {'set' if self.api_key else 'NOT SET'} ({len(self.api_key or '')} chars)")
-                if len(full_prompt) > 80_000:
-                    print(f"[INFO] Length is large - prompt/context may be too long for the API.")
-                else:
-                    print(f"[INFO] Length looks fine - more likely rate limit or API key/access.")
-                # Always show raw response preview so user can see API error (e.g. invalid key)
-                def _redact(s: str, max_len: int = 600) -> str:
-                    out = re.sub(r'sk-[a-zA-Z0-9_-]+', 'sk-***REDACTED***', s[:max_len])
-                    return out + ("..." if len(s) > max_len else "")
-                if result.stdout:
-                    print(f"[INFO] cursor-agent stdout preview: {_redact(result.stdout)}")
-                if result.stderr:
-                    print(f"[INFO] cursor-agent stderr: {_redact(result.stderr)}")
-                if verbose and result.stdout:
-                    print(f"  - Full response: {result.stdout}")
-            
-            return parsed
-            
         except subprocess.TimeoutExpired:
             raise Exception("Cursor CLI request timed out")
         except FileNotFoundError:
@@ -182,61 +185,182 @@ class CursorClient:
         except Exception as e:
             raise Exception(f"Cursor CLI error: {e}")
     
-    def _parse_output(self, raw_output: str, verbose: bool = False) -> Any:
-        """Parse cursor-agent output."""
+    async def send_message_async(self, prompt: str, context: Optional[str] = None, verbose: bool = False) -> Any:
+        """
+        Async variant of send_message: awaits the cursor-agent subprocess without blocking
+        the event loop, so several prompts can be in flight at once (see send_batch).
+        
+        Returns/Raises:
+            Same as send_message
+        """
+        full_prompt = self._full_prompt(prompt, context, verbose)
         try:
-            data = json.loads(raw_output)
+            cmd, stdin_input = self._build_cmd(full_prompt)
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if stdin_input is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=self._env,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    proc.communicate(stdin_input), timeout=CURSOR_AGENT_TIMEOUT_SEC
+                )
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise Exception("Cursor CLI request timed out")
+            return self._handle_output(
+                proc.returncode, stdout, stderr, prompt, context, full_prompt, verbose
+            )
+        except FileNotFoundError:
+            raise Exception("cursor-agent not found. Please install Cursor CLI")
+        except Exception as e:
+            raise Exception(f"Cursor CLI error: {e}")
+    
+    def send_batch(
+        self,
+        prompts: List[str],
+        context: Optional[str] = None,
+        verbose: bool = False,
+        concurrency: int = 4,
+    ) -> List[Any]:
+        """
+        Send several prompts concurrently (at most `concurrency` cursor-agent processes at once).
+        Must be called from synchronous code (runs its own event loop).
+        
+        Returns:
+            Results in prompt order; a prompt that failed yields its Exception instance
+        """
+        async def _run() -> List[Any]:
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            
+            async def _one(p: str) -> Any:
+                async with semaphore:
+                    return await self.send_message_async(p, context=context, verbose=verbose)
+            
+            return await asyncio.gather(*(_one(p) for p in prompts), return_exceptions=True)
+        
+        return asyncio.run(_run())
+    
+    def _full_prompt(self, prompt: str, context: Optional[str], verbose: bool) -> str:
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        if verbose:
+            print(f"[DEBUG] Sending to cursor-agent:")
+            print(f"  Prompt length: {len(prompt)} chars")
+            print(f"  Context length: {len(context) if context else 0} chars")
+            print(f"  Full prompt length: {len(full_prompt)} chars")
+        return full_prompt
+    
+    def _build_cmd(self, full_prompt: str) -> Tuple[List[str], Optional[bytes]]:
+        """cursor-agent argv plus stdin payload (prompt as argv, or on stdin to avoid ARG_MAX)."""
+        # One process per call: cursor-agent only offers one-shot print mode (-p), no
+        # stdio/server protocol a long-lived process could be driven through.
+        agent = self.cursor_agent_path or 'cursor-agent'
+        if self.prompt_via_stdin:
+            return [agent, '-p', '--output-format', 'json'], full_prompt.encode('utf-8')
+        return [agent, '-p', full_prompt, '--output-format', 'json'], None
+    
+    def _handle_output(
+        self,
+        returncode: int,
+        stdout: bytes,
+        stderr_raw: bytes,
+        prompt: str,
+        context: Optional[str],
+        full_prompt: str,
+        verbose: bool,
+    ) -> Any:
+        """Check exit status, parse stdout, and warn on empty results."""
+        # Keep stdout as bytes: the JSON parser takes them directly (no decode copy)
+        stderr = stderr_raw.decode('utf-8', errors='replace')
+        
+        if verbose:
+            print(f"[DEBUG] cursor-agent response:")
+            print(f"  Return code: {returncode}")
+            print(f"  Stdout length: {len(stdout)} bytes")
+            print(f"  Stderr length: {len(stderr)} chars")
+            if stdout:
+                print(f"  Stdout preview: {_decode(stdout[:500])}")
+            if stderr:
+                print(f"  Stderr preview: {stderr[:500]}")
+        
+        if returncode != 0:
+            raise Exception(f"cursor-agent failed: {stderr}")
+        
+        parsed = self._parse_output(stdout, verbose=verbose)
+        
+        if verbose:
+            print(f"[DEBUG] Parsed result type: {type(parsed)}")
+            print(f"[DEBUG] Parsed result preview: {str(parsed)[:500]}")
+        
+        # Warn if result is empty
+        if not parsed or (isinstance(parsed, str) and not parsed.strip()):
+            ctx_len = len(context) if context else 0
+            print(f"WARNING: Cursor API returned empty result. This may indicate:")
+            print(f"  - Rate limiting or quota exhausted")
+            print(f"  - API key may not have access")
+            print(f"  - Prompt/context may be too long")
+            print(f"[INFO] Context length: prompt={len(prompt)} chars, context={ctx_len} chars, full_prompt={len(full_prompt)} chars")
+            print(f"[INFO] API key: {'set' if self.api_key else 'NOT SET'} ({len(self.api_key or '')} chars)")
+            if len(full_prompt) > 80_000:
+                print(f"[INFO] Length is large - prompt/context may be too long for the API.")
+            else:
+                print(f"[INFO] Length looks fine - more likely rate limit or API key/access.")
+            # Always show raw response preview so user can see API error (e.g. invalid key)
+            stdout_text = _decode(stdout)
+            if stdout_text:
+                print(f"[INFO] cursor-agent stdout preview: {_redact(stdout_text)}")
+            if stderr:
+                print(f"[INFO] cursor-agent stderr: {_redact(stderr)}")
+            if verbose and stdout_text:
+                print(f"  - Full response: {stdout_text}")
+        
+        return parsed
+    
+    def _parse_output(self, raw_output: Union[str, bytes], verbose: bool = False) -> Any:
+        """Parse cursor-agent output (str or raw UTF-8 bytes)."""
+        try:
+            data = json_utils.loads(raw_output)
             
             if verbose:
                 print(f"[DEBUG] Parsed JSON data keys: {list(data.keys()) if isinstance(data, dict) else 'not a dict'}")
             
-            # Extract result field if present
-            if 'result' in data:
+            # Extract result field if present (one type dispatch; parsed JSON has exact types)
+            if type(data) is dict and 'result' in data:
                 result_field = data['result']
-                
-                # Extract JSON from markdown code blocks
-                if isinstance(result_field, str) and '```json' in result_field:
-                    match = re.search(r'```json\s*\n(.*?)\n```', result_field, re.DOTALL)
-                    if match:
-                        return json.loads(match.group(1).strip())
+                t = type(result_field)
                 
                 # Return result if it's structured
-                if isinstance(result_field, dict):
+                if t is dict:
                     return result_field
                 
-                # Try to extract JSON from string (array or object)
-                if isinstance(result_field, str):
-                    # First, try to parse the entire string as JSON
-                    try:
-                        return json.loads(result_field.strip())
-                    except json.JSONDecodeError:
-                        pass
-                    
-                    # Try to extract JSON array
-                    array_match = re.search(r'\[.*\]', result_field, re.DOTALL)
-                    if array_match:
-                        try:
-                            return json.loads(array_match.group(0))
-                        except json.JSONDecodeError:
-                            pass
+                if t is str:
+                    # Extract JSON from markdown code blocks
+                    if '```json' in result_field:
+                        match = _JSON_FENCE_RE.search(result_field)
+                        if match:
+                            return json_utils.loads(match.group(1).strip())
                     
-                    # Try to extract JSON object
-                    obj_match = re.search(r'\{.*\}', result_field, re.DOTALL)
-                    if obj_match:
+                    # First, try to parse the entire string as JSON (skipped for prose, which
+                    # cannot start a JSON value; embedded spans are still tried below)
+                    stripped = result_field.strip()
+                    if stripped[:1] in _JSON_START_CHARS:
                         try:
-                            return json.loads(obj_match.group(0))
+                            return json_utils.loads(stripped)
                         except json.JSONDecodeError:
                             pass
                     
-                    # If extraction fails, try to find first [ and last ]
-                    first_bracket = result_field.find('[')
-                    last_bracket = result_field.rfind(']')
-                    if first_bracket != -1 and last_bracket != -1 and last_bracket > first_bracket:
-                        try:
-                            json_str = result_field[first_bracket:last_bracket + 1]
-                            return json.loads(json_str)
-                        except json.JSONDecodeError:
-                            pass
+                    # Try the outermost [...] then {...} span (first opener to last closer)
+                    for open_c, close_c in (('[', ']'), ('{', '}')):
+                        start = result_field.find(open_c)
+                        end = result_field.rfind(close_c)
+                        if 0 <= start < end:
+                            try:
+                                return json_utils.loads(result_field[start:end + 1])
+                            except json.JSONDecodeError:
+                                pass
                     
                     # Return plain text if no JSON found
                     return result_field
@@ -245,4 +369,4 @@ class CursorClient:
             
         except json.JSONDecodeError:
             # Return raw output if not JSON
-            return raw_output
+            return _decode(raw_output)
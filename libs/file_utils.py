@@ -2,14 +2,30 @@
 
 from __future__ import annotations
 
+import functools
 import hashlib
+import os
+
+# Read size for streaming hashes (fits in L2; constant memory regardless of file size)
+_HASH_CHUNK_SIZE = 1 << 17
 
 
 def sha256_hex(path: str) -> str:
     """Compute SHA256 hash of file at path; return hex digest. Returns empty string on error."""
     try:
-        with open(path, "rb") as f:
-            return hashlib.sha256(f.read()).hexdigest()
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(hashlib, "file_digest"):
+                # Python 3.11+: streaming loop runs in C (OpenSSL picks SHA-NI when available)
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            h = hashlib.sha256()
+            buf = bytearray(_HASH_CHUNK_SIZE)
+            view = memoryview(buf)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(view[:n])
+            return h.hexdigest()
     except Exception as e:
         # Caller may log; keep signature simple
         raise OSError(f"Cannot compute hash for {path}: {e}") from e
@@ -21,3 +37,20 @@ def sha256_hex_or_empty(path: str) -> str:
         return sha256_hex(path)
     except Exception:
         return ""
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_sha256_hex(path: str, mtime_ns: int, size: int) -> str:
+    return sha256_hex(path)
+
+
+def sha256_hex_cached(path: str) -> str:
+    """
+    Like sha256_hex, but memoized per (path, mtime_ns, size): re-hashing an unchanged
+    file within a run is a stat() instead of a full read. Raises OSError on error.
+    """
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise OSError(f"Cannot compute hash for {path}: {e}") from e
+    return _cached_sha256_hex(path, st.st_mtime_ns, st.st_size)
@@ -2,12 +2,43 @@
 
 from __future__ import annotations
 
+import functools
 import json
-from typing import Any, Dict, Optional, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+# Seconds before a GitHub API request is abandoned
+REQUEST_TIMEOUT_SEC = 30
 
+# One keep-alive session per process; urllib3 retries transient 5xx on idempotent methods.
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), raise_on_status=False),
+    ),
+)
+
+
+# Retries for rate-limited (403/429) POSTs; urllib3's Retry does not retry POST
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_MAX_WAIT_SEC = 120
+
+
+def github_session() -> requests.Session:
+    """Shared requests.Session for GitHub API calls (connection reuse + retries)."""
+    return _SESSION
+
+
+@functools.lru_cache(maxsize=64)
 def split_owner_repo(repository: str) -> Tuple[str, str]:
     """Split 'owner/repo' into (owner, repo). Uses split('/', 1) for safety."""
     if "/" not in repository:
@@ -28,7 +59,7 @@ def get_pr_comment(token: str, repository: str, comment_id: int) -> Any:
     """Fetch a single PR review comment by ID."""
     owner, repo = split_owner_repo(repository)
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/comments/{comment_id}"
-    resp = requests.get(url, headers=github_headers(token))
+    resp = _SESSION.get(url, headers=github_headers(token), timeout=REQUEST_TIMEOUT_SEC)
     resp.raise_for_status()
     return resp.json()
 
@@ -37,7 +68,7 @@ def patch_pr_comment(token: str, repository: str, comment_id: int, body: str) ->
     """Update a PR review comment's body."""
     owner, repo = split_owner_repo(repository)
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/comments/{comment_id}"
-    resp = requests.patch(url, headers=github_headers(token), json={"body": body})
+    resp = _SESSION.patch(url, headers=github_headers(token), json={"body": body}, timeout=REQUEST_TIMEOUT_SEC)
     resp.raise_for_status()
 
 
@@ -63,7 +94,7 @@ def post_pr_review_comment(
         data = {"body": body}
         if in_reply_to is not None:
             data["in_reply_to"] = in_reply_to
-    return requests.post(url, headers=github_headers(token), json=data)
+    return _SESSION.post(url, headers=github_headers(token), json=data, timeout=REQUEST_TIMEOUT_SEC)
 
 
 def post_pr_review_comment_and_return_id(
@@ -79,18 +110,23 @@ def post_pr_review_comment_and_return_id(
     POST a PR review comment, log non-201 errors, raise on failure, return new comment id.
     """
     response = post_pr_review_comment(token, repository, pr_number, body, in_reply_to=in_reply_to)
-    print(f"[INFO] Comment API response status: {response.status_code}")
+    if verbose:
+        print(f"[INFO] Comment API response status: {response.status_code}")
+    # Parse the body once; used for both the error report and the new comment id
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
     if response.status_code != 201:
         print("[ERROR] Comment posting failed!")
         print(f"[ERROR] Response status: {response.status_code}")
-        print(f"[ERROR] Response body: {response.text}")
-        try:
-            error_data = response.json()
-            print(f"[ERROR] Error details: {json.dumps(error_data, indent=2)}")
-        except Exception:
-            pass
+        if data is not None:
+            print(f"[ERROR] Error details: {json.dumps(data, indent=2)}")
+        else:
+            print(f"[ERROR] Response body: {response.text}")
     response.raise_for_status()
-    data = response.json()
+    if not isinstance(data, dict):
+        return None
     if verbose:
         print("[DEBUG] Comment posted successfully")
         print(f"[DEBUG] Comment ID: {data.get('id')}")
@@ -98,12 +134,78 @@ def post_pr_review_comment_and_return_id(
     return data.get("id")
 
 
+def rate_limit_wait_sec(response: requests.Response) -> Optional[float]:
+    """
+    Seconds to wait before retrying a rate-limited response (403/429), per GitHub's guidance:
+    Retry-After, else X-RateLimit-Reset when the quota is exhausted, else one minute.
+    Returns None when the response is not rate-limited (e.g. a permission 403).
+    """
+    if response.status_code not in (403, 429):
+        return None
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return float(retry_after)
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset", "")
+        if reset.isdigit():
+            return max(0.0, int(reset) - time.time()) + 1
+    if response.status_code == 429 or "rate limit" in response.text.lower():
+        return 60.0
+    return None
+
+
+def post_pr_review_comments_bulk(
+    token: str,
+    repository: str,
+    pr_number: int,
+    payloads: List[Dict[str, Any]],
+    concurrency: int = 4,
+    *,
+    verbose: bool = False,
+) -> List[Optional[int]]:
+    """
+    POST several PR review comments concurrently over the shared session.
+    Each payload is a full create-review-comment body (body + commit_id/path/line, or body + in_reply_to).
+    Returns new comment ids in input order; None where posting failed (error is logged).
+    Opt-in: GitHub recommends creating content serially per token, and concurrent creates can hit
+    secondary rate limits. Rate-limited posts are retried after the advertised wait.
+    """
+
+    def _post(payload: Dict[str, Any]) -> Optional[int]:
+        where = f" on {payload['path']}:{payload.get('line')}" if "path" in payload else ""
+        try:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                response = post_pr_review_comment(token, repository, pr_number, body="", payload=payload)
+                wait = rate_limit_wait_sec(response)
+                if wait is None or attempt == RATE_LIMIT_RETRIES or wait > RATE_LIMIT_MAX_WAIT_SEC:
+                    break
+                print(f"[WARN] Rate limited posting review comment{where}; retrying in {wait:.0f}s")
+                time.sleep(wait)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            print(f"[ERROR] Failed to post review comment{where}: {e}")
+            return None
+        if verbose:
+            print(f"[DEBUG] Posted review comment{where}: {data.get('id')}")
+        return data.get("id")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        ids = list(executor.map(_post, payloads))
+    failed = sum(1 for comment_id in ids if comment_id is None)
+    if failed:
+        print(f"[ERROR] Failed to post {failed} of {len(ids)} review comment(s)")
+    return ids
+
+
+@functools.lru_cache(maxsize=64)
 def pr_comments_url(repository: str, pr_number: int) -> str:
     """URL for listing/posting PR review comments."""
     owner, repo = split_owner_repo(repository)
     return f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}/comments"
 
 
+@functools.lru_cache(maxsize=64)
 def pr_files_url(repository: str, pr_number: int) -> str:
     """URL for listing PR changed files."""
     owner, repo = split_owner_repo(repository)
@@ -0,0 +1,38 @@
+"""Shared JSON helpers: orjson when installed, stdlib json otherwise."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON text or UTF-8 bytes.
+    Raises json.JSONDecodeError (orjson.JSONDecodeError subclasses it).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        # json.loads would raise UnicodeDecodeError (not JSONDecodeError) on invalid UTF-8
+        data = data.decode("utf-8", errors="replace")
+    return json.loads(data)
+
+
+def dumps_compact(obj: Any) -> str:
+    """Serialize without whitespace and without escaping non-ASCII (the ISSUE_DATA format)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_indented(obj: Any) -> bytes:
+    """Serialize with 2-space indent as UTF-8 bytes (JSON files handed between workflow steps)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
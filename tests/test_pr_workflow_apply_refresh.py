@@ -22,11 +22,23 @@ import secrets
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Optional: branch checkout and commit in-process in run_setup (falls back to the git CLI)
+try:
+    import pygit2  # type: ignore
+except ImportError:
+    pygit2 = None  # type: ignore[assignment]
+
 # Default workflow file name in repo (used to find workflow runs)
 WORKFLOW_FILE = "pr-automation.yml"
 JOBS = ("analyze", "apply-logs", "refresh-patches")
@@ -51,16 +63,14 @@ def handle_request(req):
 
 
 def batch_process(items):
-    for i, x in enumerate(items):
-        y = x.strip()
-        if not y:
-            return False
+    if any(not x or not x.strip() for x in items):
+        return False
     return True
 '''
 
 # ISSUE_DATA and STATUS markers (must match refresh_related_patches.py / comment_state.py)
 ISSUE_DATA_RE = re.compile(r"<!--\s*ISSUE_DATA:\s*(.+?)\s*-->", re.DOTALL)
-STATUS_RE = re.compile(r"<!--\s*STATUS:\s*(\w+)\s*-->")
+STATUS_RE = re.compile(r"<!--\s*STATUS:\s*([A-Za-z-]+)\s*-->", re.ASCII)
 APPLIED_LINE = "✅ Applied"
 
 
@@ -81,12 +91,49 @@ def _api(session: requests.Session, method: str, url: str, **kwargs) -> Any:
     return r.json()
 
 
+# url -> (ETag, parsed JSON) for conditional polling GETs
+_ETAG_CACHE: Dict[str, Tuple[str, Any]] = {}
+
+# Poll backoff: first sleep, growth factor (capped by the caller's poll interval)
+POLL_INITIAL_DELAY_SEC = 5.0
+POLL_BACKOFF_FACTOR = 1.5
+
+
+def _api_get_conditional(session: requests.Session, url: str) -> Any:
+    """GET with If-None-Match; a 304 (no body, not counted against the rate limit) reuses cached JSON."""
+    cached = _ETAG_CACHE.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = session.get(url, headers=headers)
+    if r.status_code == 304 and cached:
+        return cached[1]
+    if not r.ok:
+        raise RuntimeError(f"GET {url} -> {r.status_code} {r.text[:500]}")
+    data = orjson.loads(r.content) if orjson is not None else r.json()
+    etag = r.headers.get("ETag")
+    if etag:
+        _ETAG_CACHE[url] = (etag, data)
+    return data
+
+
+def _next_poll_delay(delay: float, max_delay: float) -> float:
+    return min(max_delay, delay * POLL_BACKOFF_FACTOR)
+
+
 def get_pr(session: requests.Session, base: str, pr_number: int) -> Dict[str, Any]:
     return _api(session, "GET", f"{base}/pulls/{pr_number}")
 
 
 def list_review_comments(session: requests.Session, base: str, pr_number: int) -> List[Dict[str, Any]]:
-    return _api(session, "GET", f"{base}/pulls/{pr_number}/comments")
+    """All review comments on the PR (100 per page, following Link rel="next")."""
+    url: Optional[str] = f"{base}/pulls/{pr_number}/comments?per_page=100"
+    out: List[Dict[str, Any]] = []
+    while url:
+        r = session.get(url)
+        if not r.ok:
+            raise RuntimeError(f"GET {url} -> {r.status_code} {r.text[:500]}")
+        out.extend(r.json())
+        url = r.links.get("next", {}).get("url")
+    return out
 
 
 def list_commits(session: requests.Session, base: str, pr_number: int) -> List[Dict[str, Any]]:
@@ -107,22 +154,25 @@ def post_review_comment_reply(
 def list_workflow_runs(
     session: requests.Session, base: str, branch: Optional[str] = None, event: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    url = f"{base.replace('/repos/', '/repos/')}/actions/runs?per_page=20"
+    # exclude_pull_requests drops the per-run pull_requests arrays (unused here) from the payload
+    url = f"{base.replace('/repos/', '/repos/')}/actions/runs?per_page=20&exclude_pull_requests=true"
     if branch:
         url += f"&branch={branch}"
     if event:
         url += f"&event={event}"
-    data = _api(session, "GET", url)
+    data = _api_get_conditional(session, url)
     return data.get("workflow_runs", [])
 
 
 def list_run_jobs(session: requests.Session, base: str, run_id: int) -> List[Dict[str, Any]]:
     url = f"{base}/actions/runs/{run_id}/jobs"
-    data = _api(session, "GET", url)
+    data = _api_get_conditional(session, url)
     return data.get("jobs", [])
 
 
 def extract_issue_data(body: str) -> Optional[Dict[str, Any]]:
+    if "ISSUE_DATA:" not in body:
+        return None
     m = ISSUE_DATA_RE.search(body)
     if not m:
         return None
@@ -132,7 +182,28 @@ def extract_issue_data(body: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _canonical_issue_data(body: str) -> str:
+    """Canonical (sort_keys) JSON of a comment's ISSUE_DATA, for comparing snapshots."""
+    data = extract_issue_data(body)
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+    return json.dumps(data, sort_keys=True)
+
+
+# (comment id, updated_at) -> canonical ISSUE_DATA JSON; each comment revision is parsed once
+_ISSUE_DATA_KEYS: Dict[Tuple[int, str], str] = {}
+
+
+def issue_data_key(comment: Dict[str, Any]) -> str:
+    key = (comment["id"], comment.get("updated_at") or "")
+    if key not in _ISSUE_DATA_KEYS:
+        _ISSUE_DATA_KEYS[key] = _canonical_issue_data(comment.get("body") or "")
+    return _ISSUE_DATA_KEYS[key]
+
+
 def get_comment_state(body: str) -> Optional[str]:
+    if "STATUS:" not in body:
+        return None
     m = STATUS_RE.search(body)
     if not m:
         return None
@@ -153,20 +224,35 @@ def is_bot_issue_comment(comment: Dict[str, Any]) -> bool:
     return False
 
 
+# (comment id, updated_at) -> (path, line), or None when not a bot ISSUE_DATA comment
+_COMMENT_LOCATIONS: Dict[Tuple[int, str], Optional[Tuple[str, int]]] = {}
+
+
+def _bot_comment_location(c: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    if not is_bot_issue_comment(c):
+        return None
+    data = extract_issue_data(c.get("body") or "")
+    if not data:
+        return None
+    path = data.get("path") or c.get("path") or ""
+    line = data.get("line")
+    if line is None:
+        line = c.get("line") or 0
+    return (path, line)
+
+
 def bot_issue_comments_sorted_by_line(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Return bot ISSUE_DATA comments sorted by (path, line)."""
+    """Return bot ISSUE_DATA comments sorted by (path, line). Unchanged comments are parsed once across snapshots."""
     out = []
     for c in comments:
-        if not is_bot_issue_comment(c):
-            continue
-        data = extract_issue_data(c.get("body") or "")
-        if not data:
+        key = (c["id"], c.get("updated_at") or "")
+        if key in _COMMENT_LOCATIONS:
+            loc = _COMMENT_LOCATIONS[key]
+        else:
+            loc = _COMMENT_LOCATIONS[key] = _bot_comment_location(c)
+        if loc is None:
             continue
-        path = data.get("path") or c.get("path") or ""
-        line = data.get("line")
-        if line is None:
-            line = c.get("line") or 0
-        out.append((path, line, c))
+        out.append((loc[0], loc[1], c))
     out.sort(key=lambda x: (x[0], x[1]))
     return [c for _, _, c in out]
 
@@ -177,7 +263,7 @@ def poll_until_job_completes(
     branch: str,
     job_name: str,
     max_wait_sec: int = 600,
-    poll_interval_sec: int = 15,
+    poll_interval_sec: int = 30,
     event: Optional[str] = None,
 ) -> bool:
     """Poll workflow runs for this branch until a run has job_name completed (success).
@@ -188,6 +274,7 @@ def poll_until_job_completes(
         event = "pull_request_review_comment" if job_name == "apply-logs" else "pull_request"
     start = time.monotonic()
     seen_run_ids = set()
+    delay = min(POLL_INITIAL_DELAY_SEC, poll_interval_sec)
     while (time.monotonic() - start) < max_wait_sec:
         runs = list_workflow_runs(session, base, branch=branch, event=event)
         for run in runs:
@@ -201,7 +288,8 @@ def poll_until_job_completes(
                 if job.get("name") == job_name and job.get("conclusion") == "success":
                     return True
             seen_run_ids.add(run_id)
-        time.sleep(poll_interval_sec)
+        time.sleep(delay)
+        delay = _next_poll_delay(delay, poll_interval_sec)
     return False
 
 
@@ -211,11 +299,12 @@ def poll_until_synchronize_run_completes(
     branch: str,
     job_name: str,
     max_wait_sec: int = 600,
-    poll_interval_sec: int = 15,
+    poll_interval_sec: int = 30,
 ) -> bool:
     """Poll for a workflow run triggered by synchronize (push) where job_name succeeded."""
     start = time.monotonic()
     seen_run_ids = set()
+    delay = min(POLL_INITIAL_DELAY_SEC, poll_interval_sec)
     while (time.monotonic() - start) < max_wait_sec:
         runs = list_workflow_runs(session, base, branch=branch, event="pull_request")
         for run in runs:
@@ -231,22 +320,84 @@ def poll_until_synchronize_run_completes(
                 if job.get("name") == job_name and job.get("conclusion") == "success":
                     return True
             seen_run_ids.add(run_id)
-        time.sleep(poll_interval_sec)
+        time.sleep(delay)
+        delay = _next_poll_delay(delay, poll_interval_sec)
     return False
 
 
+def poll_apply_and_refresh(
+    session: requests.Session,
+    base: str,
+    branch: str,
+    max_wait_sec: int = 600,
+    poll_interval_sec: int = 30,
+) -> Tuple[bool, bool]:
+    """Watch apply-logs and refresh-patches concurrently (total wait is the longer of the two, not the sum).
+    Returns (apply_ok, refresh_ok).
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        apply_f = executor.submit(
+            poll_until_job_completes, session, base, branch, "apply-logs", max_wait_sec, poll_interval_sec
+        )
+        refresh_f = executor.submit(
+            poll_until_synchronize_run_completes, session, base, branch, "refresh-patches", max_wait_sec, poll_interval_sec
+        )
+        return apply_f.result(), refresh_f.result()
+
+
+def _pygit2_checkout_new_branch(repo_root: Path, branch: str) -> bool:
+    """git checkout -b <branch> origin/main via libgit2. False when pygit2 is unavailable or fails."""
+    if pygit2 is None:
+        return False
+    try:
+        repo = pygit2.Repository(str(repo_root))
+        start = repo.references["refs/remotes/origin/main"].peel(pygit2.Commit)
+        local = repo.branches.local.create(branch, start)
+    except Exception as e:
+        print(f"pygit2 branch create failed, using git CLI: {e}", file=sys.stderr)
+        return False
+    try:
+        repo.checkout(local)
+    except Exception as e:
+        print(f"pygit2 checkout failed, using git CLI: {e}", file=sys.stderr)
+        local.delete()
+        return False
+    return True
+
+
+def _pygit2_commit_file(repo_root: Path, rel_path: str, message: str) -> bool:
+    """git add <rel_path> && git commit via libgit2. False when pygit2 is unavailable or fails."""
+    if pygit2 is None:
+        return False
+    try:
+        repo = pygit2.Repository(str(repo_root))
+        index = repo.index
+        index.add(rel_path)
+        index.write()
+        tree = index.write_tree()
+        sig = repo.default_signature
+        repo.create_commit("HEAD", sig, sig, message, tree, [repo.head.target])
+    except Exception as e:
+        print(f"pygit2 commit failed, using git CLI: {e}", file=sys.stderr)
+        return False
+    return True
+
+
 def run_setup(owner: str, repo: str, branch: str) -> Optional[int]:
     """Create branch, add a sample file with code that lacks logging (so analyzer suggests fixes), push, open PR. Returns PR number or None."""
     repo_root = Path(__file__).resolve().parent.parent
-    # Branch from main
+    # Branch from main (fetch and push stay on the git CLI so its credential helpers apply)
     subprocess.run(["git", "fetch", "origin", "main"], check=True, cwd=repo_root)
-    subprocess.run(["git", "checkout", "-b", branch, "origin/main"], check=True, cwd=repo_root)
+    if not _pygit2_checkout_new_branch(repo_root, branch):
+        subprocess.run(["git", "checkout", "-b", branch, "origin/main"], check=True, cwd=repo_root)
     # Create a new file with code that lacks logging so the analyzer returns issues (3 spots)
     path = repo_root / TEST_WF_SAMPLE_FILE
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(TEST_WF_SAMPLE_CONTENT, encoding="utf-8")
-    subprocess.run(["git", "add", str(path)], check=True, cwd=repo_root)
-    subprocess.run(["git", "commit", "-m", "Test PR: add sample file for workflow test (code without logging)"], check=True, cwd=repo_root)
+    message = "Test PR: add sample file for workflow test (code without logging)"
+    if not _pygit2_commit_file(repo_root, TEST_WF_SAMPLE_FILE, message):
+        subprocess.run(["git", "add", str(path)], check=True, cwd=repo_root)
+        subprocess.run(["git", "commit", "-m", message], check=True, cwd=repo_root)
     subprocess.run(["git", "push", "-u", "origin", branch], check=True, cwd=repo_root)
     result = subprocess.run(
         ["gh", "pr", "create", "--repo", f"{owner}/{repo}", "--base", "main", "--head", branch, "--title", "Test: PR workflow apply + refresh", "--body", "Automated test for analyze + apply-logs + refresh-patches"],
@@ -278,7 +429,12 @@ def main() -> int:
     parser.add_argument("--branch", help="PR head branch (default: from PR or generated for setup)")
     parser.add_argument("--cleanup", action="store_true", help="Close PR and delete branch when done")
     parser.add_argument("--no-assert", action="store_true", help="Skip assertions (create PR and optionally cleanup only)")
-    parser.add_argument("--poll-interval", type=int, default=15, help="Seconds between workflow polls")
+    parser.add_argument(
+        "--poll-interval",
+        type=int,
+        default=30,
+        help="Max seconds between workflow polls (backoff starts at 5s, x1.5 per poll)",
+    )
     parser.add_argument("--max-wait", type=int, default=600, help="Max seconds to wait for a job")
     args = parser.parse_args()
 
@@ -332,10 +488,12 @@ def main() -> int:
 
     first_id = bot_comments[0]["id"]
     second_id = bot_comments[1]["id"]
+    third_id = bot_comments[2]["id"]
+    tracked_ids = {first_id, second_id, third_id}
 
     # Capture ISSUE_DATA (e.g. patch or file_hash) for 2nd and 3rd before first apply
-    def issue_data_snapshot(comment_list: List[Dict[str, Any]]) -> List[Optional[str]]:
-        return [json.dumps(extract_issue_data(c.get("body") or ""), sort_keys=True) for c in comment_list]
+    def issue_data_snapshot(comment_list: List[Dict[str, Any]]) -> Dict[int, str]:
+        return {c["id"]: issue_data_key(c) for c in comment_list if c["id"] in (second_id, third_id)}
 
     before_first = issue_data_snapshot(bot_comments)
 
@@ -343,12 +501,12 @@ def main() -> int:
     print("Posting /apply-logs reply to 1st comment...")
     post_review_comment_reply(session, base, pr_number, "/apply-logs", first_id)
 
-    print("Waiting for apply-logs job...")
-    if not poll_until_job_completes(session, base, branch, "apply-logs", args.max_wait, args.poll_interval):
+    print("Waiting for apply-logs and refresh-patches jobs...")
+    apply_ok, refresh_ok = poll_apply_and_refresh(session, base, branch, args.max_wait, args.poll_interval)
+    if not apply_ok:
         print("FAIL: apply-logs job did not complete in time", file=sys.stderr)
         return 1
-    print("Waiting for refresh-patches job (after push)...")
-    if not poll_until_synchronize_run_completes(session, base, branch, "refresh-patches", args.max_wait, args.poll_interval):
+    if not refresh_ok:
         print("FAIL: refresh-patches job did not complete in time", file=sys.stderr)
         return 1
     print("  apply-logs and refresh-patches completed")
@@ -365,7 +523,8 @@ def main() -> int:
         print(f"FAIL: expected 3 bot comments after first apply, got {len(bot_after_1)}", file=sys.stderr)
         return 1
 
-    first_body = next((c.get("body") or "" for c in bot_after_1 if c["id"] == first_id), "")
+    after_1_by_id = {c["id"]: c for c in bot_after_1 if c["id"] in tracked_ids}
+    first_body = (after_1_by_id.get(first_id) or {}).get("body") or ""
     if APPLIED_LINE not in first_body and "applied" not in (get_comment_state(first_body) or ""):
         print("FAIL: 1st comment should show Applied / STATUS applied", file=sys.stderr)
         return 1
@@ -373,7 +532,7 @@ def main() -> int:
 
     # 2nd and 3rd should have updated ISSUE_DATA (e.g. different patch after refresh)
     after_first = issue_data_snapshot(bot_after_1)
-    if after_first[1] == before_first[1] and after_first[2] == before_first[2]:
+    if after_first == before_first:
         print("FAIL: 2nd and 3rd comments should have updated ISSUE_DATA after refresh", file=sys.stderr)
         return 1
     print("  2nd and 3rd comments have updated ISSUE_DATA")
@@ -382,12 +541,12 @@ def main() -> int:
     print("Posting /apply-logs reply to 2nd comment...")
     post_review_comment_reply(session, base, pr_number, "/apply-logs", second_id)
 
-    print("Waiting for apply-logs job (2nd)...")
-    if not poll_until_job_completes(session, base, branch, "apply-logs", args.max_wait, args.poll_interval):
+    print("Waiting for apply-logs and refresh-patches jobs (2nd)...")
+    apply_ok, refresh_ok = poll_apply_and_refresh(session, base, branch, args.max_wait, args.poll_interval)
+    if not apply_ok:
         print("FAIL: second apply-logs job did not complete in time", file=sys.stderr)
         return 1
-    print("Waiting for refresh-patches job (2nd push)...")
-    if not poll_until_synchronize_run_completes(session, base, branch, "refresh-patches", args.max_wait, args.poll_interval):
+    if not refresh_ok:
         print("FAIL: second refresh-patches did not complete in time", file=sys.stderr)
         return 1
 
@@ -399,16 +558,18 @@ def main() -> int:
 
     comments_after_2 = list_review_comments(session, base, pr_number)
     bot_after_2 = bot_issue_comments_sorted_by_line(comments_after_2)
-    second_body = next((c.get("body") or "" for c in bot_after_2 if c["id"] == second_id), "")
+    after_2_by_id = {c["id"]: c for c in bot_after_2 if c["id"] in tracked_ids}
+    second_body = (after_2_by_id.get(second_id) or {}).get("body") or ""
     if APPLIED_LINE not in second_body and "applied" not in (get_comment_state(second_body) or ""):
         print("FAIL: 2nd comment should show Applied after second apply", file=sys.stderr)
         return 1
     print("  2nd comment shows Applied")
 
     # Only 3rd comment should have been refreshed (1st and 2nd are applied)
-    third_id = bot_comments[2]["id"]
-    third_before_2nd_apply = next((extract_issue_data(c.get("body") or "") for c in bot_after_1 if c["id"] == third_id), {})
-    third_after_2nd_apply = next((extract_issue_data(c.get("body") or "") for c in bot_after_2 if c["id"] == third_id), {})
+    third_before = after_1_by_id.get(third_id)
+    third_after = after_2_by_id.get(third_id)
+    third_before_2nd_apply = issue_data_key(third_before) if third_before else ""
+    third_after_2nd_apply = issue_data_key(third_after) if third_after else ""
     if third_after_2nd_apply == third_before_2nd_apply:
         print("FAIL: 3rd comment ISSUE_DATA should have been updated after 2nd refresh", file=sys.stderr)
         return 1